@@ -1,10 +1,23 @@
+import functools
+import hashlib
 import json
+import os
+import threading
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+from dates import ns_to_yyyymm
+from sentiment import build_sentiment_pipeline, score_texts
+
 # -----------------------------
 # App config
 # -----------------------------
@@ -14,6 +27,9 @@ DATA_DIR = Path(__file__).parent / "data"
 PRODUCTS_PATH = DATA_DIR / "products.json"
 TESTIMONIALS_PATH = DATA_DIR / "testimonials.json"
 REVIEWS_PATH = DATA_DIR / "reviews.json"
+SENTIMENT_CACHE_PATH = DATA_DIR / "sentiment_cache.parquet"
+
+SENTIMENT_LABELS = ["Negative", "Positive"]
 
 
 # -----------------------------
@@ -23,16 +39,52 @@ REVIEWS_PATH = DATA_DIR / "reviews.json"
 def load_json(path: Path):
     if not path.exists():
         return None
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def load_json_columns(path: Path):
+    """
+    Stream-parses a JSON array of objects straight into column lists,
+    without materializing the whole list of dicts first. Trades some load time
+    (vs orjson.loads) for a lower peak memory on large review files.
+    """
+    if not path.exists():
+        return None
+    import ijson
+
+    cols = {}
+    n = 0
+    with open(path, "rb") as f:
+        for item in ijson.items(f, "item", use_float=True):
+            for k, v in item.items():
+                if k not in cols:
+                    cols[k] = [None] * n
+                cols[k].append(v)
+            n += 1
+            # keep columns aligned when an object lacks some keys (only then is a pass needed)
+            if len(item) != len(cols):
+                for col in cols.values():
+                    if len(col) < n:
+                        col.append(None)
+    return cols
+
+
+def columns_to_df(raw) -> pd.DataFrame:
+    # scrape.py writes columnar {"field": [...]} JSON; older files are lists of records
+    if isinstance(raw, dict):
+        return pd.DataFrame.from_dict(raw, orient="columns")
+    return pd.DataFrame(raw)
+
+
 @st.cache_data
 def load_products_df() -> pd.DataFrame:
     raw = load_json(PRODUCTS_PATH)
     if raw is None:
         return pd.DataFrame()
-    return pd.DataFrame(raw)
+    return columns_to_df(raw)
 
 
 @st.cache_data
@@ -40,98 +92,192 @@ def load_testimonials_df() -> pd.DataFrame:
     raw = load_json(TESTIMONIALS_PATH)
     if raw is None:
         return pd.DataFrame()
-    return pd.DataFrame(raw)
+    return columns_to_df(raw)
 
 
 @st.cache_data
 def load_reviews_df() -> pd.DataFrame:
-    raw = load_json(REVIEWS_PATH)
+    try:
+        raw = load_json_columns(REVIEWS_PATH)
+    except ImportError:
+        raw = load_json(REVIEWS_PATH)
     if raw is None:
         return pd.DataFrame()
 
     df = pd.DataFrame(raw)
+    if df.empty:
+        return df
 
     # Expected columns: rid, date, rating, text
     # Make sure date is parsed and month is available
     if "date" in df.columns:
-        df["date"] = pd.to_datetime(df["date"], errors="coerce")
+        if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+            # Parse each unique ISO date once with an explicit format (vectorized C parser)
+            uniq = df["date"].dropna().unique()
+            # ISO8601 accepts both "2023-05-18" and full timestamps like "2023-05-18T10:00:00"
+            lut = pd.to_datetime(pd.Series(uniq), format="ISO8601", errors="coerce")
+            if not pd.api.types.is_datetime64_any_dtype(lut):
+                # mix of naive and offset-aware timestamps: normalize to naive UTC
+                lut = pd.to_datetime(pd.Series(uniq), format="ISO8601", errors="coerce", utc=True).dt.tz_localize(None)
+            df["date"] = pd.to_datetime(df["date"].map(dict(zip(uniq, lut))))
     else:
         df["date"] = pd.NaT
 
-    df["month"] = df["date"].dt.to_period("M").astype(str)  # e.g. "2023-03"
+    # Month as int32 YYYYMM (e.g. 202303): an int compare instead of per-row Python strings
+    ym = ns_to_yyyymm(df["date"].to_numpy(dtype="datetime64[ns]").view("i8"))
     # Keep only 2023 for this assignment scope (optional safety)
-    df = df[df["month"].str.startswith("2023-", na=False)].copy()
+    keep = ym // 100 == 2023  # NaT maps to 0 and is dropped here
+    # Categorical: equality filters compare int8 codes
+    df = df[keep].assign(month=pd.Categorical(ym[keep], categories=MONTHS, ordered=True))
+
+    if "text" in df.columns:
+        df["text"] = df["text"].astype("string[pyarrow]")
 
     # Clean types
     if "rating" in df.columns:
         df["rating"] = pd.to_numeric(df["rating"], errors="coerce")
 
-    # Sort newest first (common in business dashboards)
-    df = df.sort_values(by="date", ascending=False, na_position="last").reset_index(drop=True)
+    # Pre-scored by scrape.py: expose as sentiment/confidence so the app never loads the model
+    if {"sentiment_label", "sentiment_score"} <= set(df.columns) and df["sentiment_label"].notna().all():
+        is_pos = df["sentiment_label"].astype(str).str.upper().str.contains("POS")
+        df["sentiment"] = pd.Categorical(np.where(is_pos, "Positive", "Negative"), categories=SENTIMENT_LABELS)
+        df["confidence"] = pd.to_numeric(df["sentiment_score"], errors="coerce").astype(np.float32)
+        df = df.drop(columns=["sentiment_label", "sentiment_score"])
+
     return df
 
 
 # -----------------------------
 # Helpers: month select
 # -----------------------------
-def month_label(ym: str) -> str:
-    # ym like "2023-03"
-    dt = datetime.strptime(ym + "-01", "%Y-%m-%d")
+@functools.lru_cache(maxsize=64)
+def month_label(ym: int) -> str:
+    # ym like 202303
+    dt = datetime(ym // 100, ym % 100, 1)
     return dt.strftime("%B %Y")  # March 2023
 
 
 def build_month_options_2023():
-    months = [f"2023-{m:02d}" for m in range(1, 13)]
+    months = [2023 * 100 + m for m in range(1, 13)]
     labels = [month_label(m) for m in months]
     # mapping label -> ym
     return labels, months, dict(zip(labels, months))
 
 
+# Fixed for 2023, so computed once at import rather than on every rerun
+LABELS, MONTHS, LABEL_TO_MONTH = build_month_options_2023()
+
+
 # -----------------------------
 # Sentiment pipeline
 # -----------------------------
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def get_sentiment_pipeline():
     """
     Loads HF pipeline once per app session.
     If torch/transformers is missing or broken, we raise a friendly error upstream.
     """
-    from transformers import pipeline
-
-    # Force CPU to avoid GPU issues on most student setups / Render free tiers
-    return pipeline(
-        "sentiment-analysis",
-        model="distilbert-base-uncased-finetuned-sst-2-english",
-        device=-1,
-        truncation=True,
-    )
+    # More threads just contend on small shared hosts (e.g. Streamlit Cloud free tier)
+    nlp = build_sentiment_pipeline(num_threads=min(4, os.cpu_count() or 1))
+
+    # First forward pass pays lazy init / kernel selection; do it here, not on the first click
+    nlp(["warmup text"] * 4, batch_size=4)
+    return nlp
 
 
-def run_sentiment(df: pd.DataFrame) -> pd.DataFrame:
+def _warm_sentiment_pipeline() -> None:
+    try:
+        get_sentiment_pipeline()
+    except Exception:
+        # Not cached on failure; the Run Sentiment click retries and shows the error
+        pass
+
+
+@st.cache_resource(show_spinner=False)
+def start_sentiment_warmup() -> threading.Thread:
+    """
+    Builds (and warms) the pipeline on a background thread, once per server process,
+    so the first Run Sentiment click doesn't pay for model load. A click during the
+    load waits on the same cache entry instead of loading a second copy.
+    """
+    t = threading.Thread(target=_warm_sentiment_pipeline, name="sentiment-warmup", daemon=True)
+    t.start()
+    return t
+
+
+def text_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@st.cache_resource
+def load_sentiment_cache() -> dict:
+    """
+    Loads previously scored reviews from disk once per server process.
+    Maps text hash -> (label, score). Shared across sessions and updated in place.
+    """
+    if not SENTIMENT_CACHE_PATH.exists():
+        return {}
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    try:
+        table = pq.read_table(SENTIMENT_CACHE_PATH).to_pydict()
+        return dict(zip(table["hash"], zip(table["label"], table["score"])))
+    except (OSError, KeyError, pa.ArrowInvalid):
+        # Empty dir or a half-written fragment: start over rather than fail every run
+        return {}
+
+
+def save_sentiment_cache(hashes: list, results: list) -> None:
+    # Appends a new file to the parquet dataset directory, existing rows are untouched
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.table({
+        "hash": hashes,
+        "label": [str(r.get("label", "")) for r in results],
+        "score": [float(r.get("score", 0.0)) for r in results],
+    })
+    pq.write_to_dataset(table, root_path=str(SENTIMENT_CACHE_PATH))
+
+
+def run_sentiment(df: pd.DataFrame, batch_size: int = 32) -> pd.DataFrame:
     """
     Adds: sentiment (Positive/Negative), confidence (float)
+    Reviews already scored in an earlier run are served from the disk cache,
+    only the remaining texts go through the transformer.
     """
     if df.empty:
         return df
 
-    nlp = get_sentiment_pipeline()
-
     texts = df["text"].fillna("").astype(str).tolist()
-    results = nlp(texts)
+    hashes = [text_hash(t) for t in texts]
+
+    cache = load_sentiment_cache()
+    miss = {}
+    for h, t in zip(hashes, texts):
+        if h not in cache and h not in miss:
+            miss[h] = t
+
+    if miss:
+        miss_hashes = list(miss)
+        miss_results = score_texts(get_sentiment_pipeline(), list(miss.values()), batch_size=batch_size)
+        for h, r in zip(miss_hashes, miss_results):
+            cache[h] = (str(r.get("label", "")), float(r.get("score", 0.0)))
+        # Persisting is best effort: results are already in memory if data/ isn't writable
+        try:
+            save_sentiment_cache(miss_hashes, miss_results)
+        except Exception as e:
+            st.warning(f"Could not save sentiment cache to {SENTIMENT_CACHE_PATH}: {e}")
 
-    # transformers returns e.g. [{'label': 'POSITIVE', 'score': 0.999}, ...]
-    sentiments = []
-    confidences = []
-    for r in results:
-        lbl = str(r.get("label", "")).upper()
-        score = float(r.get("score", 0.0))
-        sentiments.append("Positive" if "POS" in lbl else "Negative")
-        confidences.append(score)
+    # transformers labels look like 'POSITIVE' / 'NEGATIVE'
+    res_df = pd.DataFrame([cache[h] for h in hashes], columns=["label", "score"])
+    is_pos = res_df["label"].astype(str).str.upper().str.contains("POS").to_numpy()
 
-    out = df.copy()
-    out["sentiment"] = sentiments
-    out["confidence"] = confidences
-    return out
+    return df.assign(
+        sentiment=pd.Categorical(np.where(is_pos, "Positive", "Negative"), categories=SENTIMENT_LABELS),
+        confidence=res_df["score"].to_numpy(dtype=np.float32),
+    )
 
 
 # -----------------------------
@@ -140,6 +286,7 @@ def run_sentiment(df: pd.DataFrame) -> pd.DataFrame:
 st.title("Brand Reputation Monitor (2023)")
 
 page = st.sidebar.radio("Navigation", ["Products", "Testimonials", "Reviews"], index=2)
+batch_size = st.sidebar.number_input("Sentiment batch size", min_value=1, max_value=256, value=32, step=1)
 
 if page == "Products":
     st.subheader("Products")
@@ -165,24 +312,33 @@ else:
         st.warning("reviews.json not found or empty. Run: python scrape.py")
         st.stop()
 
-    labels, months, label_to_month = build_month_options_2023()
+    # Reviews not pre-scored by scrape.py will need the model: start loading it now
+    if "sentiment" not in df_reviews.columns:
+        start_sentiment_warmup()
 
     # Default month: the latest month present in data (business-friendly)
     available_months = sorted(df_reviews["month"].dropna().unique().tolist())
-    default_month = available_months[-1] if available_months else "2023-01"
-    default_label = month_label(default_month) if default_month in months else "January 2023"
-    default_index = labels.index(default_label) if default_label in labels else 0
+    default_month = int(available_months[-1]) if available_months else 202301
+    default_label = month_label(default_month) if default_month in MONTHS else "January 2023"
+    default_index = LABELS.index(default_label) if default_label in LABELS else 0
 
-    selected_label = st.selectbox("Select month", labels, index=default_index)
-    selected_month = label_to_month[selected_label]
+    selected_label = st.selectbox("Select month", LABELS, index=default_index)
+    selected_month = LABEL_TO_MONTH[selected_label]
 
-    df_month = df_reviews[df_reviews["month"] == selected_month].copy()
+    # Only the columns used below (plus pre-scored sentiment, if any) are taken from the month slice
+    base_cols = [c for c in ["rid", "date", "rating", "text", "month"] if c in df_reviews.columns]
+    month_cols = base_cols + [c for c in ["sentiment", "confidence"] if c in df_reviews.columns]
+    df_month = df_reviews.loc[df_reviews["month"] == selected_month, month_cols]
+    # Sort newest first (common in business dashboards); only the month slice is sorted
+    df_month.sort_values(by="date", ascending=False, na_position="last", inplace=True)
 
     st.write(f"Reviews in **{selected_label}**: **{len(df_month)}**")
 
-    # Show base table first (without sentiment)
-    base_cols = [c for c in ["rid", "date", "rating", "text", "month"] if c in df_month.columns]
-    st.dataframe(df_month[base_cols], use_container_width=True, hide_index=True)
+    # Show base table first (without sentiment); month is shown as "2023-05", not the int key
+    df_show = df_month[base_cols]
+    if "month" in base_cols:
+        df_show = df_show.assign(month=f"{selected_month // 100}-{selected_month % 100:02d}")
+    st.dataframe(df_show, use_container_width=True, hide_index=True)
 
     st.divider()
     st.subheader("Sentiment analysis")
@@ -193,10 +349,13 @@ else:
 
     # We cache per month in session_state so you don’t recompute every time
     cache_key = f"sentiment_{selected_month}"
-    if run_btn:
+    if run_btn and "sentiment" in df_month.columns:
+        # Already scored offline by scrape.py
+        st.session_state[cache_key] = df_month
+    elif run_btn:
         try:
             with st.spinner("Running transformer sentiment analysis..."):
-                st.session_state[cache_key] = run_sentiment(df_month)
+                st.session_state[cache_key] = run_sentiment(df_month, batch_size=batch_size)
         except Exception as e:
             st.error(
                 "Sentiment model failed to load/run. "
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Date helpers for the reviews table.
+"""
+
+import numpy as np
+
+try:
+    from numba import config, njit, prange
+
+    # Streamlit calls this from its script thread; prefer the thread-safe OpenMP
+    # layer over TBB, which can hang interpreter shutdown after off-main-thread use
+    config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+except ImportError:  # numpy fallback below
+    njit = None
+
+
+NAT = np.iinfo(np.int64).min
+NS_PER_DAY = 86_400_000_000_000
+
+
+def _ns_to_yyyymm_numpy(ns: np.ndarray) -> np.ndarray:
+    months = ns.view("M8[ns]").astype("M8[M]").astype(np.int64)  # months since 1970-01
+    out = ((months // 12 + 1970) * 100 + months % 12 + 1).astype(np.int32)
+    out[ns == NAT] = 0
+    return out
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _ns_to_yyyymm_kernel(ns, out):
+        # Howard Hinnant's civil_from_days; divisions are by constants,
+        # which LLVM lowers to multiply + shift so the loop still vectorizes.
+        for i in prange(ns.size):
+            t = ns[i]
+            if t == NAT:
+                out[i] = 0
+                continue
+            z = t // NS_PER_DAY + 719468
+            era = (z if z >= 0 else z - 146096) // 146097
+            doe = z - era * 146097
+            yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+            doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+            mp = (5 * doy + 2) // 153
+            m = mp + 3 if mp < 10 else mp - 9
+            y = yoe + era * 400 + (1 if m <= 2 else 0)
+            out[i] = y * 100 + m
+
+
+def ns_to_yyyymm(ns: np.ndarray) -> np.ndarray:
+    """
+    int64 nanosecond timestamps (datetime64[ns] viewed as i8) -> int32 YYYYMM.
+    NaT maps to 0.
+    """
+    ns = np.ascontiguousarray(ns, dtype=np.int64)
+    if njit is None:
+        return _ns_to_yyyymm_numpy(ns)
+    out = np.empty(ns.size, dtype=np.int32)
+    _ns_to_yyyymm_kernel(ns, out)
+    return out
@@ -6,23 +6,48 @@ import json
 import os
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import urljoin, urlparse, parse_qs
 
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+try:
+    import httpx
+except ImportError:  # requests-only fallback
+    httpx = None
+
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
 
 
 BASE_URL = "https://web-scraping.dev"
+MAX_WORKERS = 8
+
+# Scraped tables are kept columnar (dict of lists), the same shape pandas builds from
+PRODUCT_FIELDS = ["name", "url", "price", "short_description", "image"]
+TESTIMONIAL_FIELDS = ["author", "text", "rating"]
+
+# Example: "page 1 of total 28 results in 6 pages"
+PAGES_RE = re.compile(r"in\s+(\d+)\s+pages", re.IGNORECASE)
 
 
 # -------------------------
 # HTTP helpers
 # -------------------------
 
-def make_session() -> requests.Session:
+def make_session(pool_size: int = 16) -> requests.Session:
     s = requests.Session()
+    # Enough pooled keep-alive connections for the page fetch thread pool
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
     s.headers.update({
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                       "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -34,18 +59,33 @@ def make_session() -> requests.Session:
     return s
 
 
+def make_http2_client(session: requests.Session) -> Optional["httpx.Client"]:
+    """
+    httpx client with HTTP/2 for the GraphQL endpoint: all review pages go over one
+    multiplexed TLS connection. Returns None if httpx (with h2) is not installed.
+    """
+    if httpx is None:
+        return None
+    try:
+        return httpx.Client(http2=True, headers=dict(session.headers))
+    except ImportError:
+        return None
+
+
 def get_html(session: requests.Session, url: str, headers: Optional[Dict[str, str]] = None, timeout: int = 30) -> str:
     resp = session.get(url, headers=headers or {}, timeout=timeout)
     resp.raise_for_status()
     return resp.text
 
 
-def post_json(session: requests.Session, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: int = 30) -> Dict[str, Any]:
+def post_json(session: Union[requests.Session, "httpx.Client"], url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: int = 30) -> Dict[str, Any]:
     h = {"Content-Type": "application/json", "Accept": "application/json"}
     if headers:
         h.update(headers)
     resp = session.post(url, json=payload, headers=h, timeout=timeout)
     resp.raise_for_status()
+    if orjson is not None:
+        return orjson.loads(resp.content)
     return resp.json()
 
 
@@ -54,6 +94,10 @@ def ensure_dir(path: str) -> None:
 
 
 def save_json(path: str, data: Any) -> None:
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
@@ -62,51 +106,51 @@ def save_json(path: str, data: Any) -> None:
 # PRODUCTS (HTML + pagination)
 # -------------------------
 
-def parse_products_from_page(html: str) -> List[Dict[str, Any]]:
-    soup = BeautifulSoup(html, "html.parser")
-    items: List[Dict[str, Any]] = []
+def empty_columns(fields: List[str]) -> Dict[str, List[Any]]:
+    return {k: [] for k in fields}
+
+
+def parse_products_from_page(html: str) -> Dict[str, List[Any]]:
+    tree = LexborHTMLParser(html)
+    items = empty_columns(PRODUCT_FIELDS)
 
-    for row in soup.select("div.row.product"):
-        name_el = row.select_one("h3 a")
-        price_el = row.select_one("div.price")
-        desc_el = row.select_one("div.short-description")
-        img_el = row.select_one("div.thumbnail img")
+    for row in tree.css("div.row.product"):
+        name_el = row.css_first("h3 a")
+        price_el = row.css_first("div.price")
+        desc_el = row.css_first("div.short-description")
+        img_el = row.css_first("div.thumbnail img")
 
-        name = name_el.get_text(strip=True) if name_el else ""
-        url = name_el["href"] if (name_el and name_el.has_attr("href")) else ""
+        name = name_el.text(strip=True) if name_el else ""
+        url = (name_el.attributes.get("href") or "") if name_el else ""
         url = urljoin(BASE_URL, url) if url else ""
 
-        price_txt = price_el.get_text(strip=True) if price_el else ""
+        price_txt = price_el.text(strip=True) if price_el else ""
         try:
             price = float(price_txt)
         except Exception:
             price = None
 
-        short_description = desc_el.get_text(" ", strip=True) if desc_el else ""
+        short_description = desc_el.text(separator=" ", strip=True) if desc_el else ""
 
-        image = img_el["src"] if (img_el and img_el.has_attr("src")) else ""
+        image = (img_el.attributes.get("src") or "") if img_el else ""
         image = urljoin(BASE_URL, image) if image else ""
 
-        items.append({
-            "name": name,
-            "url": url,
-            "price": price,
-            "short_description": short_description,
-            "image": image,
-        })
+        items["name"].append(name)
+        items["url"].append(url)
+        items["price"].append(price)
+        items["short_description"].append(short_description)
+        items["image"].append(image)
 
     return items
 
 
 def find_total_pages_products(html: str) -> Optional[int]:
-    soup = BeautifulSoup(html, "html.parser")
-    meta = soup.select_one("div.paging-meta")
+    meta = LexborHTMLParser(html).css_first("div.paging-meta")
     if not meta:
         return None
 
-    text = meta.get_text(" ", strip=True)
-    # Example: "page 1 of total 28 results in 6 pages"
-    m = re.search(r"in\s+(\d+)\s+pages", text, re.IGNORECASE)
+    text = meta.text(separator=" ", strip=True)
+    m = PAGES_RE.search(text)
     if m:
         try:
             return int(m.group(1))
@@ -115,12 +159,13 @@ def find_total_pages_products(html: str) -> Optional[int]:
     return None
 
 
-def scrape_products_html(session: requests.Session, per_category: bool = False, sleep: float = 0.0) -> List[Dict[str, Any]]:
+def scrape_products_html(session: requests.Session, per_category: bool = False, sleep: float = 0.0, max_workers: int = MAX_WORKERS) -> Dict[str, List[Any]]:
     """
     Scrape products from /products?page=N .
     By default scrapes "all" category. If per_category=True, scrapes each category filter too.
+    Page 1 gives the page count; pages 2..N are fetched concurrently.
     """
-    products: List[Dict[str, Any]] = []
+    products = empty_columns(PRODUCT_FIELDS)
 
     start_urls = [f"{BASE_URL}/products"]
     if per_category:
@@ -139,23 +184,30 @@ def scrape_products_html(session: requests.Session, per_category: bool = False,
         total_pages = find_total_pages_products(first_html) or 1
 
         # page param sometimes missing on first page. We'll normalize to explicit pages.
-        for page in range(1, total_pages + 1):
-            if page == 1:
-                html = first_html
-            else:
-                joiner = "&" if ("?" in start) else "?"
-                url = f"{start}{joiner}page={page}"
-                html = get_html(session, url, headers={"Referer": start})
-                if sleep:
-                    time.sleep(sleep)
-
+        joiner = "&" if ("?" in start) else "?"
+        page_urls = [f"{start}{joiner}page={page}" for page in range(2, total_pages + 1)]
+
+        def fetch(url: str, referer: str = start) -> str:
+            html = get_html(session, url, headers={"Referer": referer})
+            if sleep:
+                time.sleep(sleep)
+            return html
+
+        # Pages are independent once the total is known; map() keeps page order.
+        # With --sleep, fetch one page at a time so the delay still rate-limits requests.
+        workers = 1 if sleep else max(1, max_workers)
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            other_html = list(ex.map(fetch, page_urls))
+
+        for html in [first_html] + other_html:
             page_items = parse_products_from_page(html)
-            for it in page_items:
-                if it["url"] and it["url"] in seen_urls:
+            for i, url in enumerate(page_items["url"]):
+                if url and url in seen_urls:
                     continue
-                if it["url"]:
-                    seen_urls.add(it["url"])
-                products.append(it)
+                if url:
+                    seen_urls.add(url)
+                for k in PRODUCT_FIELDS:
+                    products[k].append(page_items[k][i])
 
     return products
 
@@ -185,7 +237,7 @@ query GetReviews($first: Int, $after: String) {
 """.strip()
 
 
-def scrape_reviews_graphql(session: requests.Session, first: int = 20, max_pages: int = 100, sleep: float = 0.0) -> List[Dict[str, Any]]:
+def scrape_reviews_graphql(session: Union[requests.Session, "httpx.Client"], first: int = 20, max_pages: int = 100, sleep: float = 0.0) -> List[Dict[str, Any]]:
     url = f"{BASE_URL}/api/graphql"
     after: Optional[str] = None
     out: List[Dict[str, Any]] = []
@@ -232,50 +284,45 @@ def scrape_reviews_graphql(session: requests.Session, first: int = 20, max_pages
 # TESTIMONIALS (HTMX infinite scroll)
 # -------------------------
 
-def parse_testimonials_fragment(html: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+def parse_testimonials_fragment(html: str) -> Tuple[Dict[str, List[Any]], Optional[str]]:
     """
     Parses either the full testimonials page HTML or the HTMX fragment HTML returned by /api/testimonials?page=N.
     Returns (testimonials, next_hx_get_url).
     """
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
-    testimonials: List[Dict[str, Any]] = []
+    testimonials = empty_columns(TESTIMONIAL_FIELDS)
+    next_url = None
     # In full page, they live under: div.testimonials > div.testimonial
-    for card in soup.select("div.testimonial"):
+    for card in tree.css("div.testimonial"):
+        # The next HTMX loader is the first card that has hx-get; picked up in the same pass
+        if next_url is None and card.attributes.get("hx-get"):
+            next_url = urljoin(BASE_URL, card.attributes["hx-get"])
+
         # text
-        text_el = card.select_one("p.text")
-        text = text_el.get_text(" ", strip=True) if text_el else ""
+        text_el = card.css_first("p.text")
+        text = text_el.text(separator=" ", strip=True) if text_el else ""
 
         # rating = count of star svgs inside span.rating
-        rating_el = card.select_one("span.rating")
+        rating_el = card.css_first("span.rating")
         rating = None
         if rating_el:
-            svgs = rating_el.select("svg")
-            rating = len(svgs) if svgs else 0
+            rating = len(rating_el.css("svg"))
 
         # author: there is no visible author name; use identicon username if present
-        ident = card.select_one("identicon-svg")
+        ident = card.css_first("identicon-svg")
         author = ""
-        if ident and ident.has_attr("username"):
-            author = ident["username"]
+        if ident and ident.attributes.get("username"):
+            author = ident.attributes["username"]
 
-        testimonials.append({
-            "author": author,
-            "text": text,
-            "rating": rating,
-        })
-
-    # Find next HTMX loader (the div that has hx-get)
-    next_url = None
-    loader = soup.select_one("div.testimonial[hx-get]")
-    if loader and loader.has_attr("hx-get"):
-        next_url = loader["hx-get"]
-        next_url = urljoin(BASE_URL, next_url)
+        testimonials["author"].append(author)
+        testimonials["text"].append(text)
+        testimonials["rating"].append(rating)
 
     return testimonials, next_url
 
 
-def scrape_testimonials_htmx(session: requests.Session, max_pages: int = 50, sleep: float = 0.0) -> List[Dict[str, Any]]:
+def scrape_testimonials_htmx(session: requests.Session, max_pages: int = 50, sleep: float = 0.0) -> Dict[str, List[Any]]:
     """
     Scrapes testimonials by:
     1) GET /testimonials -> parse initial 10 (includes the loader card too, which is also a testimonial)
@@ -311,24 +358,49 @@ def scrape_testimonials_htmx(session: requests.Session, max_pages: int = 50, sle
 
         chunk = resp.text
         items, next_url = parse_testimonials_fragment(chunk)
-        all_items.extend(items)
+        for k in TESTIMONIAL_FIELDS:
+            all_items[k].extend(items[k])
 
         if sleep:
             time.sleep(sleep)
 
     # Deduplicate (same text+author+rating)
     seen = set()
-    uniq: List[Dict[str, Any]] = []
-    for t in all_items:
-        key = (t.get("author", ""), t.get("text", ""), t.get("rating", None))
+    uniq = empty_columns(TESTIMONIAL_FIELDS)
+    for key in zip(all_items["author"], all_items["text"], all_items["rating"]):
         if key in seen:
             continue
         seen.add(key)
-        uniq.append(t)
+        for k, v in zip(TESTIMONIAL_FIELDS, key):
+            uniq[k].append(v)
 
     return uniq
 
 
+# -------------------------
+# SENTIMENT (offline pre-scoring)
+# -------------------------
+
+def score_reviews(reviews: List[Dict[str, Any]], batch_size: int = 64) -> List[Dict[str, Any]]:
+    """
+    Attaches sentiment_label / sentiment_score to each review so the Streamlit app
+    can show sentiment without loading the transformer.
+    """
+    from sentiment import build_sentiment_pipeline, score_texts
+
+    if not reviews:
+        return reviews
+
+    nlp = build_sentiment_pipeline()
+    texts = [str(r.get("text") or "") for r in reviews]
+    results = score_texts(nlp, texts, batch_size=batch_size)
+
+    for r, res in zip(reviews, results):
+        r["sentiment_label"] = str(res.get("label", ""))
+        r["sentiment_score"] = float(res.get("score", 0.0))
+    return reviews
+
+
 # -------------------------
 # MAIN
 # -------------------------
@@ -337,22 +409,26 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Scrape web-scraping.dev: products, reviews, testimonials")
     parser.add_argument("--outdir", default="data", help="Output directory (default: data)")
     parser.add_argument("--sleep", type=float, default=0.0, help="Sleep seconds between requests (default: 0)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help=f"Concurrent page fetches for products, ignored when --sleep is set (default: {MAX_WORKERS})")
     parser.add_argument("--products-per-category", action="store_true", help="Also scrape each product category")
     parser.add_argument("--reviews-first", type=int, default=20, help="GraphQL page size for reviews (default: 20)")
     parser.add_argument("--reviews-max-pages", type=int, default=200, help="Max GraphQL pages for reviews (default: 200)")
     parser.add_argument("--testimonials-max-pages", type=int, default=200, help="Max HTMX pages for testimonials (default: 200)")
+    parser.add_argument("--no-http2", action="store_true", help="Use plain requests instead of httpx HTTP/2 for GraphQL reviews")
+    parser.add_argument("--no-sentiment", action="store_true", help="Skip offline sentiment scoring of reviews")
+    parser.add_argument("--sentiment-batch-size", type=int, default=64, help="Batch size for sentiment scoring (default: 64)")
 
     args = parser.parse_args()
     ensure_dir(args.outdir)
 
-    session = make_session()
+    session = make_session(pool_size=max(16, args.workers))
 
     # PRODUCTS
     print("Scraping products (HTML + pagination)...")
-    products = scrape_products_html(session, per_category=args.products_per_category, sleep=args.sleep)
+    products = scrape_products_html(session, per_category=args.products_per_category, sleep=args.sleep, max_workers=args.workers)
     products_path = os.path.join(args.outdir, "products.json")
     save_json(products_path, products)
-    print(f"-> {len(products)} products saved to {os.path.abspath(products_path)}")
+    print(f"-> {len(products['name'])} products saved to {os.path.abspath(products_path)}")
 
     # TESTIMONIALS
     print("Scraping testimonials (HTMX infinite scroll)...")
@@ -367,15 +443,41 @@ def main() -> None:
 
     testimonials_path = os.path.join(args.outdir, "testimonials.json")
     save_json(testimonials_path, testimonials)
-    print(f"-> {len(testimonials)} testimonials saved to {os.path.abspath(testimonials_path)}")
+    print(f"-> {len(testimonials['author'])} testimonials saved to {os.path.abspath(testimonials_path)}")
 
     # REVIEWS
     print("Scraping reviews (GraphQL)...")
-    reviews = scrape_reviews_graphql(session, first=args.reviews_first, max_pages=args.reviews_max_pages, sleep=args.sleep)
+    # Cursors are opaque, so pages are fetched in order; HTTP/2 cuts per-request overhead
+    gql_client = None if args.no_http2 else make_http2_client(session)
+    try:
+        reviews = scrape_reviews_graphql(gql_client or session, first=args.reviews_first, max_pages=args.reviews_max_pages, sleep=args.sleep)
+    finally:
+        if gql_client is not None:
+            gql_client.close()
+
     reviews_path = os.path.join(args.outdir, "reviews.json")
     save_json(reviews_path, reviews)
     print(f"-> {len(reviews)} reviews saved to {os.path.abspath(reviews_path)}")
 
+    # SENTIMENT (best effort: the scrape above is already saved if the model can't run)
+    if not args.no_sentiment:
+        print("Scoring review sentiment (offline)...")
+        try:
+            reviews = score_reviews(reviews, batch_size=args.sentiment_batch_size)
+        except Exception as e:
+            print(f"WARNING: sentiment scoring failed, keeping unscored reviews ({e}). "
+                  "Use --no-sentiment to skip this step.")
+        else:
+            save_json(reviews_path, reviews)
+            sentiment_path = os.path.join(args.outdir, "reviews_with_sentiment.json")
+            save_json(sentiment_path, {
+                "exported_at": datetime.now().isoformat(timespec="seconds"),
+                "count": len(reviews),
+                "reviews": reviews,
+            })
+            print(f"-> {len(reviews)} scored reviews saved to {os.path.abspath(reviews_path)} "
+                  f"and {os.path.abspath(sentiment_path)}")
+
     print("Done.")
 
 
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Sentiment model shared by app.py (interactive) and scrape.py (pre-scoring).
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+SENTIMENT_MODEL_ID = "distilbert-base-uncased-finetuned-sst-2-english"
+ONNX_DIR = Path(__file__).parent / ".cache" / "onnx_sst2"
+ONNX_FILE = "model_quantized.onnx"
+
+
+# -------------------------
+# Model loading
+# -------------------------
+
+def load_onnx_model(num_threads: Optional[int] = None):
+    """
+    Exports DistilBERT SST-2 to ONNX and quantizes it to int8 (dynamic, VNNI) once.
+    The result is persisted under .cache/onnx_sst2/ so later cold starts just load it.
+    """
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    if not (ONNX_DIR / ONNX_FILE).exists():
+        ort_model = ORTModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_ID, export=True)
+        quantizer = ORTQuantizer.from_pretrained(ort_model)
+        qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=ONNX_DIR, quantization_config=qconfig)
+
+    session_options = onnxruntime.SessionOptions()
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+
+    # onnxruntime applies its graph fusions (attention, gelu, layernorm) at session creation
+    return ORTModelForSequenceClassification.from_pretrained(
+        ONNX_DIR,
+        file_name=ONNX_FILE,
+        provider="CPUExecutionProvider",
+        session_options=session_options,
+    )
+
+
+def load_torch_quantized_model(num_threads: Optional[int] = None):
+    """
+    Fallback when optimum/onnxruntime are not installed:
+    dynamic int8 quantization of the Linear layers in eager PyTorch.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_ID)
+    model.eval()
+
+    if "onednn" in torch.backends.quantized.supported_engines:
+        torch.backends.quantized.engine = "onednn"
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def build_sentiment_pipeline(num_threads: Optional[int] = None):
+    """
+    Prefers the int8 ONNX Runtime model, falls back to quantized PyTorch.
+    num_threads caps intra-op CPU threads (None = library default, all cores).
+    """
+    from transformers import AutoTokenizer, pipeline
+
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_ID)
+    try:
+        model = load_onnx_model(num_threads=num_threads)
+    except ImportError:
+        model = load_torch_quantized_model(num_threads=num_threads)
+
+    # Force CPU to avoid GPU issues on most student setups / Render free tiers
+    return pipeline(
+        "sentiment-analysis",
+        model=model,
+        tokenizer=tokenizer,
+        device=-1,
+        truncation=True,
+    )
+
+
+# -------------------------
+# Inference
+# -------------------------
+
+def score_texts(nlp, texts: List[str], batch_size: int = 32) -> List[Dict[str, Any]]:
+    """
+    Runs the transformer on texts and returns results in input order.
+    Texts are sorted by token length before batching so each batch pads
+    to a similar length, then results are put back in the original order.
+    """
+    lengths = nlp.tokenizer(texts, truncation=True, return_length=True)["length"]
+    order = np.argsort(lengths, kind="stable")
+    inv = np.empty_like(order)
+    inv[order] = np.arange(len(order))
+
+    sorted_texts = [texts[i] for i in order]
+    # num_workers=0: DataLoader worker processes only add overhead on CPU
+    sorted_results = nlp(sorted_texts, batch_size=int(batch_size), truncation=True, num_workers=0)
+    return [sorted_results[i] for i in inv]